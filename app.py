@@ -2,16 +2,28 @@
 # -*- coding: utf-8 -*-
 """
 MiniPy — მსუბუქი Python UI დამწყებთათვის.
-ღილაკები: Open, Save, Run, Clear, Exit.
-Hotkeys: Ctrl+O / Ctrl+S / Ctrl+R / Ctrl+L / Ctrl+Q.
+ღილაკები: New, Open, Save, Run, Clear, Exit.
+Hotkeys: Ctrl+N / Ctrl+O / Ctrl+S / Ctrl+R / Ctrl+L / Ctrl+Q.
+Ctrl+K — kernel-ის გადატვირთვა (ღილაკის გარეშე).
 Run იყენებს: %run -i <მიმდინარე ფაილი>
 """
 
-import os, sys, shlex
+import hashlib, importlib.util, mmap, os, sys, shlex, shutil, tempfile
 from typing import Optional
 
-from PySide6.QtCore import Qt, QFile, QTextStream, QStringConverter, QTimer
-from PySide6.QtGui import QAction, QKeySequence
+from PySide6.QtCore import (
+    Qt,
+    QSettings,
+    QThread,
+    QTimer,
+    Signal,
+)
+from PySide6.QtGui import (
+    QAction,
+    QFontMetricsF,
+    QKeySequence,
+    QTextDocument,
+)
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -20,13 +32,140 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
     QPushButton,
     QPlainTextEdit,
+    QPlainTextDocumentLayout,
     QFileDialog,
     QMessageBox,
     QLabel,
     QStatusBar,
 )
-from qtconsole.rich_jupyter_widget import RichJupyterWidget
-from qtconsole.inprocess import QtInProcessKernelManager
+
+_MMAP_THRESHOLD = 1 << 20  # 1 MiB-ზე დიდი ფაილები mmap-ით იკითხება
+_WRITE_BUFFER = 1 << 16  # 64 KiB ბლოკები ჩაწერისას
+_FSYNC_ON_SAVE = False  # True — შენახვისას დისკზე დაზღვევა (os.fsync)
+# ახალი ფაილის უფლებები; umask იკითხება ერთხელ, სანამ kernel-ის thread გაეშვება
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+_NEW_FILE_MODE = 0o666 & ~_UMASK
+_LARGE_FILE_BYTES = 2 * 1024 * 1024  # ზღვარი QSettings-ში: "large_file_bytes"
+_REPL_BUFFER_LINES = 500  # REPL-ის scrollback, QSettings-ში: "repl_buffer"
+
+# ჰარის სიგანე (family, pointSizeF) შრიფტისთვის — იზომება ერთხელ
+_SPACE_ADV_CACHE: dict[tuple[str, float], float] = {}
+
+_KERNEL_ARGS = ["--colors=Linux"]
+_KERNEL_ARGV = [sys.executable, "-m", "ipykernel_launcher", "-f", "{connection_file}"]
+
+_PY_VER = sys.version.split()[0]
+_BANNER = f"MiniPy — Python {_PY_VER} | Type ? for help\n"
+
+_DEMO_TEXT = "# MiniPy\nprint('გამარჯობა MiniPy-დან!')\nx = 2 + 2\nprint('x =', x)\n"
+
+# UI სტრიქონები — ერთი ასლი ყველა MiniPy ფანჯრისთვის
+_STR_OPEN_TITLE = sys.intern("ფაილის გახსნა")
+_STR_SAVE_AS_TITLE = sys.intern("შენახვა როგორც…")
+_STR_ERROR = sys.intern("შეცდომა")
+_STR_INFO = sys.intern("ინფორმაცია")
+_STR_RUN_NEEDS_SAVE = sys.intern("გასაშვებად საჭიროა ფაილის შენახვა.")
+_STR_SAVE_NEEDED = sys.intern("შენახვა საჭიროა")
+_STR_UNSAVED = sys.intern("ფაილი შეცვლილია და ჯერ არ არის შენახული.")
+_STR_ASK_SAVE = sys.intern("გინდა შევინახო?")
+_STR_SAVE = sys.intern("შენახვა")
+_STR_DISCARD = sys.intern("უგულებელყოფა")
+_STR_CANCEL = sys.intern("გაუქმება")
+_STR_LARGE_FILE = sys.intern("დიდი ფაილი")
+_STR_OPEN_READ_ONLY = sys.intern(
+    "ფაილი ძალიან დიდია რედაქტირებისთვის. გავხსნა მხოლოდ წასაკითხად?"
+)
+
+
+def _read_source(path: str) -> str:
+    """ფაილს კითხულობს UTF-8-ად (BOM-ით ან მის გარეშე).
+
+    დიდი ფაილები mmap-იდან პირდაპირ იშიფრება — შუალედური bytes ასლის გარეშე.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= _MMAP_THRESHOLD:
+            return f.read().decode("utf-8-sig", "replace")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return str(view, "utf-8-sig", "replace")
+
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
+    """data იწერება იმავე დირექტორიის დროებით ფაილში და os.replace-ით ანაცვლებს path-ს.
+
+    symlink-ის შემთხვევაში იცვლება თავად სამიზნე ფაილი; არსებული უფლებები
+    (მაგ. shebang სკრიპტის exec bit) ინახება.
+    """
+    target = os.path.realpath(path)
+    fd, tmp = tempfile.mkstemp(
+        prefix=".minipy_", suffix=".tmp", dir=os.path.dirname(target)
+    )
+    try:
+        with open(fd, "wb", buffering=_WRITE_BUFFER) as f:
+            n = f.write(data)
+            if n != len(data):
+                raise OSError(f"short write {n}/{len(data)}")
+            f.flush()
+            if _FSYNC_ON_SAVE:
+                os.fsync(f.fileno())
+        if os.path.exists(target):
+            shutil.copymode(target, tmp)
+        else:
+            # mkstemp-ის 0600-ის ნაცვლად — ჩვეულებრივი ახალი ფაილის უფლებები
+            os.chmod(tmp, _NEW_FILE_MODE)
+        os.replace(tmp, target)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class _KernelStarter(QThread):
+    """kernel-ის გაშვება/გადატვირთვა ცალკე thread-ში — fork/exec GUI-ს არ აჩერებს."""
+
+    ready = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, km, parent=None, restart: bool = False):
+        super().__init__(parent)
+        self._km = km
+        self._restart = restart
+
+    def run(self):
+        km = self._km
+        if self._restart:
+            try:
+                km.restart_kernel(now=True)
+            except Exception as e:
+                self.failed.emit(str(e))
+                return
+            self.ready.emit(km)
+            return
+        try:
+            km.start_kernel(extra_arguments=_KERNEL_ARGS)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.ready.emit(km)
+
+
+def _local_spec_manager():
+    """KernelSpecManager, რომლის "python3" — MiniPy-ის საკუთარი ინტერპრეტატორია."""
+    from jupyter_client.kernelspec import KernelSpec, KernelSpecManager
+
+    class _LocalSpecManager(KernelSpecManager):
+        def get_kernel_spec(self, kernel_name):
+            if kernel_name == "python3":
+                return KernelSpec(
+                    argv=_KERNEL_ARGV, display_name="Python 3", language="python"
+                )
+            return super().get_kernel_spec(kernel_name)
+
+    return _LocalSpecManager()
 
 
 class MiniPy(QMainWindow):
@@ -35,37 +174,88 @@ class MiniPy(QMainWindow):
         self.setWindowTitle("MiniPy")
         self.resize(960, 640)
         self.current_path: Optional[str] = None
+        self.settings = QSettings("MiniPy", "MiniPy")
+        # ბოლოს ჩაწერილი (path, sha256, mtime_ns) — უცვლელ ფაილს ხელახლა არ ვწერთ
+        self._saved_digest: Optional[tuple] = None
+        # toPlainText()-ის UTF-8 ასლი; უქმდება, როცა დოკუმენტი „შეიცვლება“
+        self._cached_data: Optional[bytes] = None
+
+        # „*“ სათაურში იკრიბება: ბევრი ცვლილება → ერთი setWindowModified.
+        # თავად სათაური მხოლოდ ფაილის სახელის შეცვლისას ახლდება.
+        self._title_timer = QTimer(self)
+        self._title_timer.setSingleShot(True)
+        self._title_timer.setInterval(100)
+        self._title_timer.timeout.connect(
+            lambda: self.setWindowModified(self.editor.document().isModified())
+        )
+        self._last_title = ""
 
         # --- Editor ---
         self.editor = QPlainTextEdit()
         self.editor.setPlaceholderText("# აქ დაწერე Python კოდი…")
-        self.editor.document().modificationChanged.connect(self._on_modified)
+        self._doc = self.editor.document()
+        self._doc.modificationChanged.connect(self._on_modified)
+        self._apply_tab_stop()
+        QApplication.instance().fontChanged.connect(self._on_font_changed)
 
         # --- Console ---
-        self.console = self._make_console()
+        # qtconsole/IPython მძიმე იმპორტია — REPL იქმნება პირველი გამოსახვის შემდეგ,
+        # მანამდე მის ადგილას დგას „Starting kernel…“ placeholder.
+        self.kernel_manager = None
+        self.kernel_client = None
+        self._repl_ready = False
+        self._start_thread: Optional[_KernelStarter] = None
+        self._local_spec = False  # kernel ეშვება _local_spec_manager()-ით
+        # Run, რომლის execute_reply-საც ველით: (სახელი, execute_request-ის msg_id)
+        self._running: Optional[tuple[str, str]] = None
+        self._clear_fn = lambda: None
+        self._repl_started = False
+        self.console = self._repl_placeholder = self._create_repl_placeholder()
 
         # --- Buttons ---
+        new_btn = QPushButton("New")
         open_btn = QPushButton("Open")
         save_btn = QPushButton("Save")
-        run_btn = QPushButton("Run")
+        run_btn = self.run_btn = QPushButton("Run")
+        run_btn.setEnabled(False)  # ჩაირთვება, როცა kernel მზად იქნება
         clear_btn = QPushButton("Clear")
         exit_btn = QPushButton("Exit")
 
+        new_btn.clicked.connect(self.new_file)
         open_btn.clicked.connect(self.open_file)
         save_btn.clicked.connect(self.save_file)
         run_btn.clicked.connect(self.run_current_file)
         clear_btn.clicked.connect(self.clear_repl)
         exit_btn.clicked.connect(self.close)  # მნიშვნელოვანია: closeEvent გამოიძახოს
 
+        # Hotkeys პირდაპირ ღილაკებზე; სტანდარტული — პლატფორმის შესაბამისი (⌘O macOS-ზე)
+        new_btn.setShortcut(QKeySequence(QKeySequence.StandardKey.New))
+        open_btn.setShortcut(QKeySequence(QKeySequence.StandardKey.Open))
+        save_btn.setShortcut(QKeySequence(QKeySequence.StandardKey.Save))
+        run_btn.setShortcut(QKeySequence("Ctrl+R"))
+        clear_btn.setShortcut(QKeySequence("Ctrl+L"))
+        # Windows-ზე StandardKey.Quit ცარიელია — იქ Ctrl+Q დავტოვოთ
+        if QKeySequence.keyBindings(QKeySequence.StandardKey.Quit):
+            exit_btn.setShortcut(QKeySequence(QKeySequence.StandardKey.Quit))
+        else:
+            exit_btn.setShortcut(QKeySequence("Ctrl+Q"))
+
+        # ბრძანებები, რომლებსაც ღილაკი არ აქვთ
+        for text, key, slot in (("Restart kernel", "Ctrl+K", self.restart_kernel),):
+            act = QAction(text, self)
+            act.setShortcut(QKeySequence(key))
+            act.triggered.connect(slot)
+            self.addAction(act)
+
         h = QHBoxLayout()
-        for b in (open_btn, save_btn, run_btn, clear_btn, exit_btn):
+        for b in (new_btn, open_btn, save_btn, run_btn, clear_btn, exit_btn):
             h.addWidget(b)
         h.addStretch(1)
 
         top = QWidget()
         top.setLayout(h)
 
-        v = QVBoxLayout()
+        v = self._layout = QVBoxLayout()
         v.addWidget(top)
         v.addWidget(QLabel("კოდი:"))
         v.addWidget(self.editor, 3)
@@ -81,78 +271,237 @@ class MiniPy(QMainWindow):
         self.setStatusBar(self.status)
         self.mod_label = QLabel("")  # „Modified“ ინდიკატორი
         self.status.addPermanentWidget(self.mod_label)
+        # ერთი საკუთარი ტაიმერი ყველა დროებითი შეტყობინებისთვის
+        self._status_timer = QTimer(self)
+        self._status_timer.setSingleShot(True)
+        self._status_timer.timeout.connect(self.status.clearMessage)
+
+        # ფაილის დიალოგები ერთხელ იქმნება და მეორდება
+        self._make_dialogs()
+        self._err_dialog = QMessageBox(self)
+        self._err_dialog.setIcon(QMessageBox.Critical)
+        self._err_dialog.setStandardButtons(QMessageBox.Ok)
 
-        # Actions / shortcuts
-        self._make_actions()
         self._update_title()
 
         # Demo text
         if not self.editor.toPlainText().strip():
-            self.editor.setPlainText(
-                "# MiniPy\nprint('გამარჯობა MiniPy-დან!')\nx = 2 + 2\nprint('x =', x)\n"
-            )
-
-        # REPL ბანერი
-        QTimer.singleShot(
-            0, lambda: self._execute_in_repl("print('MiniPy kernel ready')")
-        )
+            self.editor.setPlainText(_DEMO_TEXT)
 
     # ------------------------------------------------------------------
-    def _make_console(self) -> RichJupyterWidget:
-        km = QtInProcessKernelManager()
-        km.start_kernel(show_banner=False)
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._repl_started:
+            # REPL — პირველი showEvent-ის შემდეგ, event loop-ის მომდევნო ციკლზე
+            self._repl_started = True
+            QTimer.singleShot(0, self._promote_to_jupyter)
+
+    def _create_repl_placeholder(self) -> QPlainTextEdit:
+        w = QPlainTextEdit("Starting kernel…")
+        w.setReadOnly(True)
+        return w
+
+    def _promote_to_jupyter(self, local_spec: bool = True) -> None:
+        from qtconsole.manager import QtKernelManager
+
+        # kernel ცალკე პროცესშია — მომხმარებლის კოდი GUI thread-ს არ ბლოკავს
+        # PyInstaller-ის build-ში sys.executable თავად MiniPy-ა — იქ მხოლოდ kernelspec
+        frozen = getattr(sys, "frozen", False)
+        has_ipykernel = importlib.util.find_spec("ipykernel") is not None
+        self._local_spec = local_spec and has_ipykernel and not frozen
+        if self._local_spec:
+            # kernel-ების დირექტორიების სკანირების ნაცვლად — იგივე ინტერპრეტატორი,
+            # რომლითაც MiniPy მუშაობს
+            km = QtKernelManager(
+                kernel_name="python3", kernel_spec_manager=_local_spec_manager()
+            )
+        else:
+            km = QtKernelManager(kernel_name="python3")
+        # restarter-ის QTimer GUI thread-ში უნდა შეიქმნას — ირთვება _make_console-ში
+        km.autorestart = False
         self.kernel_manager = km
-        self.kernel = km.kernel
-        self.kernel.gui = "qt"
+
+        t = self._start_thread = _KernelStarter(km, self)
+        t.ready.connect(self._attach_repl)
+        t.failed.connect(self._on_kernel_failed)
+        t.start()
+
+    def _on_kernel_failed(self, error: str) -> None:
+        km = self.kernel_manager
+        self._start_thread.wait()
+        if not km.has_kernel:
+            # kernel არ გაშვებულა — connection ფაილი runtime დირექტორიაში არ დარჩეს
+            try:
+                km.cleanup_resources()
+            except Exception:
+                pass
+            if self._local_spec:
+                # ჩაშენებული spec არ გამოდგა — ერთხელ ვცდით ჩვეულებრივი kernelspec-ის ძებნით
+                self._promote_to_jupyter(local_spec=False)
+                return
+        self._status(f"REPL ვერ გაეშვა: {error}", 0)
+
+    def _attach_repl(self, km) -> None:
+        w = self._make_console(km)
+        self._layout.replaceWidget(self._repl_placeholder, w)
+        self._repl_placeholder.deleteLater()
+        self._repl_placeholder = None
+        self.console = w
+        self._repl_ready = True
+        self.run_btn.setEnabled(True)
+        self._execute_in_repl("print('MiniPy kernel ready')")
+
+    def _make_console(self, km) -> QWidget:
+        from qtconsole.rich_jupyter_widget import RichJupyterWidget
+
+        # client-ის არხები და restarter GUI thread-ში იქმნება (QObject/QTimer)
+        km.autorestart = True
+        km.start_restarter()
 
         kc = km.client()
         kc.start_channels()
         self.kernel_client = kc
 
-        w = RichJupyterWidget()
+        # შეზღუდული scrollback — ახალი ხაზის ჩასმა სესიის სიგრძეზე არ არის დამოკიდებული
+        buffer_size = int(self.settings.value("repl_buffer", _REPL_BUFFER_LINES))
+        w = RichJupyterWidget(banner=_BANNER, buffer_size=buffer_size)
         w.kernel_manager = km
         w.kernel_client = kc
-        w.banner = ""
+        # reset(clear=True) ასუფთავებს ეკრანსაც და prompt-ის მდგომარეობასაც
+        self._clear_fn = lambda: w.reset(clear=True)
+        w.executed.connect(self._on_executed)
+        # მოკვდა kernel Run-ის დროს — execute_reply აღარ მოვა
+        stopped = lambda *_: self._forget_running(stopped=True)
+        km.kernel_restarted.connect(stopped)
+        kc.hb_channel.kernel_died.connect(stopped)
         return w
 
-    def _execute_in_repl(self, code: str) -> None:
+    def _execute_in_repl(self, code: str) -> Optional[str]:
+        """აბრუნებს გაგზავნილი execute_request-ის msg_id-ს; None — REPL ჯერ არ არის მზად."""
+        if not self._repl_ready:
+            self._status("REPL ჯერ არ არის მზად…")
+            return None
+        # console.execute() msg_id-ს არ აბრუნებს — widget-ი მას _request_info-ში იწერს
+        before = set(self.console._request_info["execute"])
         self.console.execute(code)
+        sent = set(self.console._request_info["execute"]) - before
+        return next(iter(sent), None)
+
+    def _status(self, msg: str, ms: int = 3000) -> None:
+        """ms=0 — შეტყობინება რჩება, სანამ ახალი არ ჩაანაცვლებს."""
+        self.status.showMessage(msg)
+        if ms:
+            self._status_timer.start(ms)
+        else:
+            self._status_timer.stop()
+
+    def _show_error(self, title: str, msg: str) -> None:
+        self._err_dialog.setWindowTitle(title)
+        self._err_dialog.setText(msg)
+        self._err_dialog.exec()
 
     # ------------------------------------------------------------------
+    def _apply_tab_stop(self) -> None:
+        font = self.editor.font()
+        key = (font.family(), font.pointSizeF())
+        adv = _SPACE_ADV_CACHE.get(key)
+        if adv is None:
+            adv = _SPACE_ADV_CACHE[key] = QFontMetricsF(font).horizontalAdvance(" ")
+        self.editor.setTabStopDistance(4 * adv)
+
+    def _on_font_changed(self, _font) -> None:
+        self._apply_tab_stop()
+
     def _on_modified(self, modified: bool) -> None:
+        if modified:
+            self._cached_data = None
         self.mod_label.setText("Modified" if modified else "")
-        self._update_title()
+        self._title_timer.start()
 
     def _update_title(self) -> None:
         name = self.current_path or "untitled.py"
-        mod = "*" if self.editor.document().isModified() else ""
-        self.setWindowTitle(f"MiniPy — {os.path.basename(name)}{mod}")
+        # QFileDialog ყველა პლატფორმაზე '/'-ს აბრუნებს;
+        # [*]-ს ადგილას Qt თავად სვამს „*“-ს, როცა windowModified ჩართულია
+        title = f"MiniPy — {name.rpartition('/')[2] or name}[*]"
+        if title != self._last_title:
+            self.setWindowTitle(title)
+            self._last_title = title
 
     # ------------------------------------------------------------------
+    def new_file(self):
+        if not self._maybe_save_changes():
+            return
+        self._set_document("")
+        self.current_path = None
+        self._saved_digest = None
+        self._update_title()
+        self._on_modified(False)
+
     def open_file(self):
         if not self._maybe_save_changes():
             return
-        path, _ = QFileDialog.getOpenFileName(
-            self, "ფაილის გახსნა", "", "Python Files (*.py);;All Files (*)"
-        )
-        if not path:
+        if not self._open_dlg.exec():
             return
+        path = self._open_dlg.selectedFiles()[0]
 
-        qf = QFile(path)
-        if not qf.open(QFile.ReadOnly | QFile.Text):
-            QMessageBox.critical(self, "შეცდომა", f"ვერ გაიხსნა:\n{path}")
+        try:
+            # დიდ ფაილზე რედაქტირება (layout + undo) UI-ს ყინავს — ვთავაზობთ read-only-ს
+            limit = int(self.settings.value("large_file_bytes", _LARGE_FILE_BYTES))
+            read_only = os.path.getsize(path) > limit
+            if read_only:
+                answer = QMessageBox.warning(
+                    self,
+                    _STR_LARGE_FILE,
+                    _STR_OPEN_READ_ONLY,
+                    QMessageBox.Yes | QMessageBox.Cancel,
+                )
+                if answer != QMessageBox.Yes:
+                    return
+            text = _read_source(path)
+        except OSError:
+            self._show_error(_STR_ERROR, f"ვერ გაიხსნა:\n{path}")
             return
 
-        s = QTextStream(qf)
-        s.setEncoding(QStringConverter.Encoding.Utf8)
-        text = s.readAll()
-        qf.close()
-
-        self.editor.setPlainText(text)
-        self.editor.document().setModified(False)
+        self._set_document(text, read_only)
         self.current_path = path
+        self._saved_digest = None
         self._update_title()
-        self.status.showMessage(f"გახსნილია: {path}", 3000)
+        self._on_modified(False)
+        self._status(f"გახსნილია: {path}")
+
+    def _set_document(self, text: str, read_only: bool = False) -> None:
+        """ტექსტი ივსება view-სგან მოწყვეტილ დოკუმენტში; layout ერთხელ ეშვება მიბმისას."""
+        doc = QTextDocument(self.editor)
+        doc.setDocumentLayout(QPlainTextDocumentLayout(doc))
+        doc.setDefaultFont(self.editor.font())
+        # საწყისი ჩატვირთვა undo-ში არ იწერება და სიგნალებს არ აგზავნის
+        doc.setUndoRedoEnabled(False)
+        doc.blockSignals(True)
+        try:
+            doc.setPlainText(text)
+        finally:
+            doc.blockSignals(False)
+            doc.setUndoRedoEnabled(not read_only)
+            doc.setModified(False)
+        self._cached_data = None
+
+        ed = self.editor
+        old = self._doc
+        # Qt თავად შლის მხოლოდ საკუთარ (შიდა control-ის) დოკუმენტს;
+        # editor-ის შვილი წინა დოკუმენტები აქ უნდა წავშალოთ
+        ours = old.parent() is ed
+        ed.setUpdatesEnabled(False)
+        try:
+            old.modificationChanged.disconnect(self._on_modified)
+            ed.setDocument(doc)
+            if ours:
+                old.deleteLater()
+            ed.setReadOnly(read_only)
+            doc.modificationChanged.connect(self._on_modified)
+            self._doc = doc
+            self._apply_tab_stop()  # tab stop დოკუმენტის QTextOption-შია
+        finally:
+            ed.setUpdatesEnabled(True)
 
     def save_file(self) -> bool:
         if not self.current_path:
@@ -160,14 +509,10 @@ class MiniPy(QMainWindow):
         return self._write_to_path(self.current_path)
 
     def save_file_as(self) -> bool:
-        path, _ = QFileDialog.getSaveFileName(
-            self,
-            "შენახვა როგორც…",
-            self.current_path or "untitled.py",
-            "Python Files (*.py);;All Files (*)",
-        )
-        if not path:
+        self._save_dlg.selectFile(self.current_path or "untitled.py")
+        if not self._save_dlg.exec():
             return False
+        path = self._save_dlg.selectedFiles()[0]
         ok = self._write_to_path(path)
         if ok:
             self.current_path = path
@@ -175,42 +520,121 @@ class MiniPy(QMainWindow):
         return ok
 
     def _write_to_path(self, path: str) -> bool:
-        qf = QFile(path)
-        if not qf.open(QFile.WriteOnly | QFile.Text):
-            QMessageBox.critical(self, "შეცდომა", f"ვერ შეინახა:\n{path}")
-            return False
-        s = QTextStream(qf)
-        s.setEncoding(QStringConverter.Encoding.Utf8)
-        s << self.editor.toPlainText()
-        qf.close()
+        data = self._cached_data
+        if data is None:
+            # ერთი encode CPython-ის UTF-8 encoder-ით, QTextStream-ის ნაწილ-ნაწილ codec-ის ნაცვლად
+            data = self.editor.toPlainText().encode("utf-8")
+        digest = hashlib.sha256(data).digest()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        # დისკზე იგივე ბაიტებია და ფაილს გარედან არავინ შეხებია — ჩაწერა ზედმეტია
+        if self._saved_digest == (path, digest, mtime):
+            msg = f"შენახულია (ცვლილების გარეშე): {path}"
+        else:
+            try:
+                _atomic_write_bytes(path, data)
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self._show_error(_STR_ERROR, f"ვერ შეინახა:\n{path}")
+                return False
+            self._saved_digest = (path, digest, mtime)
+            msg = f"შენახულია: {path}"
+        # ქეში მხოლოდ წარმატებული შენახვის შემდეგ; შემდეგი ცვლილება აუქმებს
+        self._cached_data = data
         self.editor.document().setModified(False)
         self.mod_label.setText("")
-        self.status.showMessage(f"შენახულია: {path}", 3000)
+        self._status(msg)
         return True
 
     # ------------------------------------------------------------------
     def run_current_file(self):
         if not self.current_path:
             if not self.save_file_as():
-                QMessageBox.information(
-                    self, "ინფორმაცია", "გასაშვებად საჭიროა ფაილის შენახვა."
-                )
+                QMessageBox.information(self, _STR_INFO, _STR_RUN_NEEDS_SAVE)
                 return
         if self.editor.document().isModified():
             if not self._maybe_save_changes():
                 return
-        quoted = shlex.quote(self.current_path)
-        self._execute_in_repl(f"%run -i {quoted}")
-        self.status.showMessage(f"გაშვებულია: {self.current_path}", 3000)
+        path = str(self.current_path)
+        # %run POSIX-ზე shell-ის წესით ჰყოფს არგუმენტებს, Windows-ზე კი
+        # Python-ის literal-ს იღებს (backslash-ები shlex-ს არ ესმის)
+        quoted = shlex.quote(path) if os.name != "nt" else repr(path)
+        msg_id = self._execute_in_repl(f"%run -i {quoted}")
+        if msg_id is None:
+            return
+        self._running = (path, msg_id)
+        self._status(f"გაშვებულია: {path}", 0)
+
+    def _on_executed(self, msg) -> None:
+        """execute_reply — Run-ის დასრულებას სტატუს-ბარი kernel-ის პასუხით იგებს."""
+        # executed მოდის console-ში აკრეფილ ყველა უჯრაზეც — მხოლოდ ჩვენი Run-ის პასუხი
+        running = self._running
+        if running is None or msg["parent_header"].get("msg_id") != running[1]:
+            return
+        name, self._running = running[0], None
+        if msg["content"].get("status") == "ok":
+            self._status(f"დასრულდა: {name}")
+        else:
+            self._status(f"შეცდომით დასრულდა: {name}")
 
     def clear_repl(self):
-        try:
-            self.console.clear()
-        except Exception:
-            try:
-                self.console._control.clear()
-            except Exception:
-                pass
+        self._clear_fn()
+        # reset() ივიწყებს მიმდინარე execute მოთხოვნას — executed აღარ მოვა
+        self._forget_running()
+
+    def _forget_running(self, stopped: bool = False) -> None:
+        if self._running is not None:
+            name = self._running[0]
+            self._status(f"შეწყდა: {name}" if stopped else f"გაშვებულია: {name}")
+            self._running = None
+
+    def restart_kernel(self):
+        """მხოლოდ kernel-ის პროცესი ეშვება თავიდან; ვიჯეტი, client და scrollback რჩება.
+
+        პორტები გადატვირთვისას იგივე რჩება, ამიტომ არსებული client თავად
+        უერთდება ახალ kernel-ს.
+        """
+        if not self._repl_ready:
+            self._status("REPL ჯერ არ არის მზად…")
+            return
+        km = self.kernel_manager
+        self._running = None  # გაჩერებული kernel-ისგან execute_reply არ მოვა
+        self._repl_ready = False
+        self.run_btn.setEnabled(False)
+        # heartbeat-მა kernel-ის გაჩერება „სიკვდილად“ არ უნდა ჩათვალოს;
+        # restarter-ის QTimer კი მხოლოდ GUI thread-იდან ჩერდება
+        self.kernel_client.hb_channel.pause()
+        km.stop_restarter()
+        km.autorestart = False
+        self._status("kernel გადაიტვირთება…", 0)
+
+        t = self._start_thread = _KernelStarter(km, self, restart=True)
+        t.ready.connect(self._on_kernel_restarted)
+        t.failed.connect(self._on_restart_failed)
+        t.start()
+
+    def _on_kernel_restarted(self, km) -> None:
+        self.console._kernel_restarted_message(died=False)
+        self._resume_kernel()
+        self._status("kernel გადაიტვირთა", 2000)
+
+    def _on_restart_failed(self, error: str) -> None:
+        # REPL ისევ მზადაა — Ctrl+K-ით შეიძლება თავიდან ცდა
+        self._resume_kernel()
+        self._status(f"kernel ვერ გადაიტვირთა: {error}", 0)
+
+    def _resume_kernel(self) -> None:
+        """restart_kernel-ის შეჩერებულს აბრუნებს (restarter, heartbeat, Run)."""
+        km = self.kernel_manager
+        km.autorestart = True
+        km.start_restarter()
+        self.kernel_client.hb_channel.unpause()
+        # შეწყვეტილ Run-ს პასუხი აღარ მოვა — reset() ხსნის _executing-ს და სვამს ახალ prompt-ს
+        self.console.reset()
+        self._repl_ready = True
+        self.run_btn.setEnabled(True)
 
     # ------------------------------------------------------------------
     def _maybe_save_changes(self) -> bool:
@@ -220,14 +644,14 @@ class MiniPy(QMainWindow):
 
         msg = QMessageBox(self)
         msg.setIcon(QMessageBox.Warning)
-        msg.setWindowTitle("შენახვა საჭიროა")
-        msg.setText("ფაილი შეცვლილია და ჯერ არ არის შენახული.")
-        msg.setInformativeText("გინდა შევინახო?")
-        save_btn = msg.addButton("შენახვა", QMessageBox.AcceptRole)
+        msg.setWindowTitle(_STR_SAVE_NEEDED)
+        msg.setText(_STR_UNSAVED)
+        msg.setInformativeText(_STR_ASK_SAVE)
+        save_btn = msg.addButton(_STR_SAVE, QMessageBox.AcceptRole)
         discard_btn = msg.addButton(
-            "უგულებელყოფა", QMessageBox.DestructiveRole
+            _STR_DISCARD, QMessageBox.DestructiveRole
         )  # ← სწორი enum
-        cancel_btn = msg.addButton("გაუქმება", QMessageBox.RejectRole)
+        cancel_btn = msg.addButton(_STR_CANCEL, QMessageBox.RejectRole)
         msg.setDefaultButton(save_btn)
         msg.exec()
 
@@ -240,29 +664,52 @@ class MiniPy(QMainWindow):
 
     def closeEvent(self, event):
         if self._maybe_save_changes():
-            try:
-                self.kernel_client.stop_channels()
-                self.kernel_manager.shutdown_kernel(now=True)
-            except Exception:
-                pass
+            self._shutdown_kernel()
             event.accept()
         else:
             event.ignore()
 
+    def _shutdown_kernel(self, timeout: float = 0.5) -> None:
+        """თავაზიანი shutdown შეზღუდული ლოდინით; გაჭედილ kernel-ს კლავს."""
+        if self._start_thread is not None:
+            self._start_thread.wait()  # kernel შეიძლება ჯერ ეშვებოდეს
+        km, kc = self.kernel_manager, self.kernel_client
+        if kc is not None:
+            try:
+                kc.stop_channels()
+            except Exception:
+                pass
+        if km is None or not km.has_kernel:
+            return
+        try:
+            km.stop_restarter()  # მომაკვდავი kernel თავიდან არ უნდა აღდგეს
+            km.request_shutdown(restart=False)
+            km.finish_shutdown(waittime=timeout)
+        except Exception:
+            try:
+                km.kill_kernel()
+            except Exception:
+                pass
+        finally:
+            try:
+                km.cleanup_resources()
+            except Exception:
+                pass
+
     # ------------------------------------------------------------------
-    def _make_actions(self):
-        actions = [
-            ("Open", "Ctrl+O", self.open_file),
-            ("Save", "Ctrl+S", self.save_file),
-            ("Run", "Ctrl+R", self.run_current_file),
-            ("Clear", "Ctrl+L", self.clear_repl),
-            ("Exit", "Ctrl+Q", self.close),
-        ]
-        for text, key, slot in actions:
-            act = QAction(text, self)
-            act.setShortcut(QKeySequence(key))
-            act.triggered.connect(slot)
-            self.addAction(act)
+    def _make_dialogs(self):
+        filters = "Python Files (*.py);;All Files (*)"
+
+        self._open_dlg = QFileDialog(self, _STR_OPEN_TITLE, "", filters)
+        self._open_dlg.setFileMode(QFileDialog.ExistingFile)
+
+        self._save_dlg = QFileDialog(self, _STR_SAVE_AS_TITLE, "", filters)
+        self._save_dlg.setAcceptMode(QFileDialog.AcceptSave)
+        self._save_dlg.setFileMode(QFileDialog.AnyFile)
+
+        for dlg in (self._open_dlg, self._save_dlg):
+            dlg.setOption(QFileDialog.DontUseNativeDialog, False)
+            dlg.setOption(QFileDialog.DontUseCustomDirectoryIcons, True)
 
 
 def main() -> int: